@@ -1,13 +1,28 @@
 import os
-import tempfile
+
+# librosa feature extraction already runs on its own thread pool (and FFTs on
+# scipy's workers), and the model only sees small batches, so BLAS/OpenMP threads
+# would just oversubscribe the cores. Must be set before numpy is imported.
+# Not applied to the torch backend, whose CPU kernels use OpenMP intra-op threads.
+if os.environ.get('GENRE_FEATURE_BACKEND', 'librosa') != 'torch':
+    for _var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ.setdefault(_var, '1')
+
+import hashlib
+import threading
+from collections import OrderedDict
 import numpy as np
 import joblib
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
+from batcher import MicroBatcher
 from feature_extractor import (
-    extract_features_from_file,
+    FEATURE_NAMES,
+    SERVING_DURATION,
+    SERVING_SR,
     extract_features_from_bytes,
     extract_features_from_system_audio,
+    warmup,
 )
 
 
@@ -19,44 +34,151 @@ CORS(app)
 # Allowed audio extensions
 ALLOWED_EXTENSIONS = {'wav', 'mp3', 'ogg', 'flac', 'webm', 'mp4', 'm4a', 'aac'}
 
+# Second output of a converted classifier: probabilities, or decision values
+ONNX_SCORES_OUTPUT = 'probabilities'
+
 
 # Load model artifacts once at startup
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Artifacts must match the feature settings (GENRE_SERVING_SR / GENRE_SERVING_DURATION)
+MODEL_DIR = os.environ.get('GENRE_MODEL_DIR', BASE_DIR)
+
+model = joblib.load(os.path.join(MODEL_DIR, 'genre_classifier.pkl'))
+scaler = joblib.load(os.path.join(MODEL_DIR, 'genre_scaler.pkl'))
+label_encoder = joblib.load(os.path.join(MODEL_DIR, 'genre_label_encoder.pkl'))
+
+# The scaler was fitted on a DataFrame. Features are now plain ndarrays in
+# FEATURE_NAMES order, so check the order once and drop the stored names to
+# skip sklearn's per-call feature-name validation (and its warning).
+if hasattr(scaler, 'feature_names_in_'):
+    if list(scaler.feature_names_in_) != FEATURE_NAMES:
+        raise RuntimeError("Scaler feature order does not match FEATURE_NAMES")
+    del scaler.feature_names_in_
 
-model = joblib.load(os.path.join(BASE_DIR, 'genre_classifier.pkl'))
-scaler = joblib.load(os.path.join(BASE_DIR, 'genre_scaler.pkl'))
-label_encoder = joblib.load(os.path.join(BASE_DIR, 'genre_label_encoder.pkl'))
+# Index -> genre name, resolved once instead of per prediction
+CLASSES = label_encoder.classes_.tolist()
 
 print(f"✓ Model loaded:  {type(model).__name__}")
 print(f"✓ Scaler loaded:  {type(scaler).__name__}")
-print(f"✓ Labels:  {list(label_encoder.classes_)}")
+print(f"✓ Labels:  {CLASSES}")
+print(f"✓ Features:  {SERVING_DURATION:g}s @ {SERVING_SR} Hz")
 
 
 def _allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def _predict(features: np.ndarray) -> dict:
+def _sklearn_scores(features: np.ndarray) -> np.ndarray:
     """
-    Scale features -> predict -> build response dict.
+    Scale a (B, 57) batch -> raw model scores (probabilities or decision values).
     """
     # Scale with the same scaler used during training
     features_scaled = scaler.transform(features)
 
-    
     # If the model supports predict_proba (SVM trained with probability=True)
     if hasattr(model, 'predict_proba'):
-        probas = model.predict_proba(features_scaled)[0]
-    elif hasattr(model, 'decision_function'):
-        # Convert SVM decision function to pseudo-probabilities via softmax
-        decision = model.decision_function(features_scaled)[0]
-        exp_d = np.exp(decision - np.max(decision))  # numerical stability
-        probas = exp_d / exp_d.sum()
+        return model.predict_proba(features_scaled)
+    if hasattr(model, 'decision_function'):
+        return model.decision_function(features_scaled)
+    # Fallback: just predict, one-hot scores
+    return np.eye(len(CLASSES))[model.predict(features_scaled)]
+
+
+def _load_onnx_session():
+    """
+    Convert scaler + model into one ONNX graph and open it with onnxruntime.
+
+    Returns None (sklearn is used) if ONNX is disabled, the converters are not
+    installed, or the ONNX scores disagree with sklearn's on a probe batch.
+    """
+    if os.environ.get('GENRE_ONNX', '1') != '1':
+        return None
+    if not (hasattr(model, 'predict_proba') or hasattr(model, 'decision_function')):
+        return None
+    try:
+        import onnxruntime as ort
+        from skl2onnx import convert_sklearn
+        from skl2onnx.common.data_types import FloatTensorType
+        from sklearn.pipeline import make_pipeline
+    except ImportError:
+        return None
+
+    try:
+        onx = convert_sklearn(
+            make_pipeline(scaler, model),
+            initial_types=[('X', FloatTensorType([None, len(FEATURE_NAMES)]))],
+            options={id(model): {'zipmap': False}},
+        )
+        session = ort.InferenceSession(
+            onx.SerializeToString(), providers=['CPUExecutionProvider'],
+        )
+
+        # Probe around the training distribution and compare with sklearn
+        rng = np.random.default_rng(0)
+        probe = (scaler.mean_ + rng.standard_normal((16, len(FEATURE_NAMES))) * scaler.scale_)
+        probe = probe.astype(np.float32)
+        onnx_scores = session.run([ONNX_SCORES_OUTPUT], {'X': probe})[0]
+    except Exception as e:
+        print(f"✗ ONNX conversion failed, using sklearn:  {e}")
+        return None
+
+    if not np.allclose(onnx_scores, _sklearn_scores(probe), atol=1e-3):
+        print("✗ ONNX scores differ from sklearn, using sklearn")
+        return None
+    return session
+
+
+onnx_session = _load_onnx_session()
+print(f"✓ Inference:  {'onnxruntime' if onnx_session is not None else 'sklearn'}")
+
+
+def _score_batch(features: np.ndarray) -> np.ndarray:
+    """
+    Score a (B, 57) batch -> (B, n_classes) class probabilities.
+    """
+    if onnx_session is not None:
+        # The graph is float32 end to end (sklearn's libsvm SVMs always compute in
+        # float64). It returns float32; softmax and rounding happen in float64
+        # so responses carry the same plain 4-decimal floats as the sklearn path
+        scores = onnx_session.run(
+            [ONNX_SCORES_OUTPUT], {'X': features.astype(np.float32, copy=False)}
+        )[0].astype(np.float64)
     else:
-        # Fallback: just predict, no confidence
-        pred_idx = model.predict(features_scaled)[0]
-        genre = label_encoder.inverse_transform([pred_idx])[0]
+        scores = _sklearn_scores(features)
+
+    if not hasattr(model, 'predict_proba') and hasattr(model, 'decision_function'):
+        # Convert SVM decision function to pseudo-probabilities via softmax
+        exp_d = np.exp(scores - scores.max(axis=1, keepdims=True))  # numerical stability
+        return exp_d / exp_d.sum(axis=1, keepdims=True)
+    return scores
+
+
+# Pay JIT / FFT / model cold-start costs now rather than on the first request
+if os.environ.get('GENRE_WARMUP', '1') == '1':
+    _score_batch(warmup())
+    print("✓ Warm-up done")
+
+
+# Concurrent requests are coalesced into one _score_batch call
+batcher = MicroBatcher(_score_batch)
+
+
+def _predict(features: np.ndarray) -> dict:
+    """
+    Score features (micro-batched) -> build response dict.
+    """
+    # sklearn rejects non-finite input but onnxruntime doesn't; check here so both
+    # paths fail the request, and a bad row never shares a batch with good ones
+    if not np.isfinite(features).all():
+        raise ValueError("Input X contains NaN or infinity.")
+
+    probas = batcher.submit(features)
+
+    if not (hasattr(model, 'predict_proba') or hasattr(model, 'decision_function')):
+        # Plain predict, no confidence
+        pred_idx = int(np.argmax(probas))
+        genre = CLASSES[pred_idx]
         return {
             'genre': genre,
             'confidence': 1.0,
@@ -64,13 +186,12 @@ def _predict(features: np.ndarray) -> dict:
         }
 
     # Sort by confidence (descending)
-    sorted_indices = np.argsort(probas)[::-1]
-    top_genres = []
-    for idx in sorted_indices:
-        top_genres.append({
-            'genre': label_encoder.inverse_transform([idx])[0],
-            'confidence': round(float(probas[idx]), 4),
-        })
+    order = np.argsort(-probas)
+    confidences = np.round(probas[order], 4).tolist()
+    top_genres = [
+        {'genre': CLASSES[idx], 'confidence': conf}
+        for idx, conf in zip(order.tolist(), confidences)
+    ]
 
     best = top_genres[0]
     return {
@@ -80,6 +201,52 @@ def _predict(features: np.ndarray) -> dict:
     }
 
 
+class _PredictionCache:
+    """
+    Thread-safe LRU of response dicts, keyed by a digest of the audio bytes.
+
+    (functools.lru_cache would have to key on, and keep, the uploads themselves.)
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            return result
+
+    def put(self, key: bytes, result: dict):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+# Retries and re-uploads of the same file skip extraction and inference entirely
+prediction_cache = _PredictionCache(int(os.environ.get('GENRE_CACHE_SIZE', 512)))
+
+
+def _predict_bytes(audio_bytes: bytes, suffix: str = '.webm') -> dict:
+    """
+    Audio bytes -> response dict, served from prediction_cache when seen before.
+    """
+    key = hashlib.blake2b(audio_bytes, digest_size=16).digest()
+    result = prediction_cache.get(key)
+    if result is None:
+        features = extract_features_from_bytes(audio_bytes, suffix=suffix)
+        result = _predict(features)
+        # Errors raise before this point; never cache a response that isn't valid JSON
+        if np.isfinite([g['confidence'] for g in result['top_genres']]).all():
+            prediction_cache.put(key, result)
+    return result
+
+
 @app.route('/')
 def serve_frontend():
     return send_from_directory(FRONTEND_DIR, 'index.html')
@@ -96,7 +263,7 @@ def health():
     return jsonify({
         'status': 'ok',
         'model': type(model).__name__,
-        'genres': list(label_encoder.classes_),
+        'genres': CLASSES,
     })
 
 
@@ -104,7 +271,7 @@ def health():
 def genres():
     """Return list of supported genres."""
     return jsonify({
-        'genres': list(label_encoder.classes_),
+        'genres': CLASSES,
     })
 
 
@@ -128,18 +295,14 @@ def predict():
             'error': f'Unsupported file type. Allowed: {", ".join(sorted(ALLOWED_EXTENSIONS))}',
         }), 400
 
-    # Save to temp file for librosa to read
+    # Decode from memory; only formats soundfile can't read touch a (RAM-backed) temp file
     ext = file.filename.rsplit('.', 1)[1].lower()
-    tmp = tempfile.NamedTemporaryFile(suffix=f'.{ext}', delete=False)
     try:
-        file.save(tmp.name)
-        features = extract_features_from_file(tmp.name)
-        result = _predict(features)
+        audio_bytes = file.stream.read()
+        result = _predict_bytes(audio_bytes, suffix=f'.{ext}')
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': f'Failed to process audio: {str(e)}'}), 500
-    finally:
-        os.unlink(tmp.name)
 
 
 @app.route('/predict/record', methods=['POST'])
@@ -155,8 +318,7 @@ def predict_record():
         return jsonify({'error': 'No audio data received.'}), 400
 
     try:
-        features = extract_features_from_bytes(audio_bytes)
-        result = _predict(features)
+        result = _predict_bytes(audio_bytes)
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': f'Failed to process audio: {str(e)}'}), 500
@@ -187,5 +349,5 @@ def predict_system():
 
 
 if __name__ == '__main__':
-   
+    # Development server only; in production run `gunicorn app:app` (see gunicorn.conf.py)
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,108 @@
+"""
+Micro-batching for model inference.
+
+Concurrent requests each submit one row of features. A background thread
+coalesces whatever arrives within a short window into a single (B, 57)
+matrix and runs the batch function once, so the scaler and model see one
+call per batch instead of one per request.
+"""
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class _Slot:
+    """One pending request: its input row, and where the worker puts the answer."""
+    __slots__ = ('features', 'event', 'result', 'error')
+
+    def __init__(self, features: np.ndarray):
+        self.features = features
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-row calls into batched calls of `batch_fn`.
+
+    Args:
+        batch_fn: Maps a (B, n_features) array to a (B, ...) array
+        max_batch_size: Upper bound on B
+        max_wait: Seconds to wait for more requests after the first one arrives
+    """
+
+    def __init__(self, batch_fn, max_batch_size: int = 32, max_wait: float = 0.01):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = None
+        self._lock = threading.Lock()
+        self._owner_pid = None
+
+    def submit(self, features: np.ndarray) -> np.ndarray:
+        """
+        Queue one (1, n_features) row and block until its batch has run.
+
+        Returns:
+            The row of batch_fn's output for this request
+
+        Raises:
+            Whatever batch_fn raised for the batch this row was part of
+        """
+        self._ensure_worker()
+        slot = _Slot(features)
+        self._queue.put(slot)
+        slot.event.wait()
+        if slot.error is not None:
+            raise slot.error
+        return slot.result
+
+    def _ensure_worker(self):
+        # Threads don't survive fork (e.g. gunicorn --preload), so the worker
+        # is started lazily, once per process.
+        if self._owner_pid == os.getpid():
+            return
+        with self._lock:
+            if self._owner_pid != os.getpid():
+                self._queue = queue.Queue()
+                worker = threading.Thread(
+                    target=self._run, args=(self._queue,), name='micro-batcher', daemon=True,
+                )
+                worker.start()
+                self._owner_pid = os.getpid()
+
+    def _run(self, pending: queue.Queue):
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            self._dispatch(batch)
+            for slot in batch:
+                slot.event.set()
+
+    def _dispatch(self, batch: list):
+        try:
+            results = self.batch_fn(np.concatenate([slot.features for slot in batch]))
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].error = e
+                return
+            # Retry one row at a time so only the failing request sees the error
+            for slot in batch:
+                self._dispatch([slot])
+            return
+
+        for slot, row in zip(batch, results):
+            slot.result = row
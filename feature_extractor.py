@@ -1,9 +1,44 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Persist Numba JIT artifacts (librosa's and ours) across restarts.
+# Must be set before numba is imported.
+os.environ.setdefault('NUMBA_CACHE_DIR', '/tmp/numba_cache')
+
 import numpy as np
-import pandas as pd
 import librosa
+import numba
 import noisereduce as nr
 import io
 import soundfile as sf
+import scipy.fft
+
+
+# 'librosa' (default, matches the training pipeline) or 'torch' (TorchAudio, GPU if available)
+FEATURE_BACKEND = os.environ.get('GENRE_FEATURE_BACKEND', 'librosa')
+if FEATURE_BACKEND == 'torch':
+    import torch_features
+
+# Take harmony/percussive stats on the HPSS magnitudes instead of the
+# reconstructed waveforms. Cheaper, but needs a model retrained on these features.
+HPSS_SPECTRAL = os.environ.get('GENRE_HPSS_SPECTRAL', '0') == '1'
+
+# Threads used to compute independent features of one clip concurrently
+FEATURE_WORKERS = int(os.environ.get('GENRE_FEATURE_WORKERS', min(8, os.cpu_count() or 1)))
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+# Threads per FFT call. librosa (>= 0.11) runs its transforms on scipy.fft,
+# which is single-threaded unless told otherwise; frames of one STFT are
+# independent, so it can split them across workers. The shared STFT runs
+# before the pool fans out and gets every core; FFTs inside pool tasks
+# (iSTFT, tempo autocorrelation) share the cores with the other pool threads.
+FFT_WORKERS = int(os.environ.get('GENRE_FFT_WORKERS', os.cpu_count() or 1))
+POOL_FFT_WORKERS = int(os.environ.get(
+    'GENRE_POOL_FFT_WORKERS', max(1, (os.cpu_count() or 1) // FEATURE_WORKERS)
+))
 
 
 # Exact feature order matching the training data
@@ -24,63 +59,128 @@ for i in range(1, 21):
 
 assert len(FEATURE_NAMES) == 57, f"Expected 57 features, got {len(FEATURE_NAMES)}"
 
+# STFT parameters (librosa defaults, used for the training data)
+N_FFT = 2048
+HOP_LENGTH = 512
+
+
+# Analysis window and sample rate. The defaults are what the shipped model was
+# trained on (GTZAN 30 s clips at 22.05 kHz). Shorter / lower-rate serving
+# (e.g. 10 s at 16 kHz) cuts extraction cost, but needs a scaler and model
+# retrained on features computed with the same settings (see GENRE_MODEL_DIR in app.py).
+SERVING_SR = int(os.environ.get('GENRE_SERVING_SR', 22050))
+SERVING_DURATION = float(os.environ.get('GENRE_SERVING_DURATION', 30.0))
+
+# Resampler for every load/resample call: soxr (C + SIMD) rather than resampy
+RES_TYPE = 'soxr_hq'
+
+# Formats decoded in-process by soundfile; everything else goes through librosa.load
+SOUNDFILE_EXTENSIONS = {'wav', 'flac', 'ogg'}
 
-def extract_features_from_file(file_path: str, duration: float = 30.0) -> np.ndarray:
+# Temp files for the librosa fallback go to a RAM-backed filesystem when there is one
+TEMP_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def warmup() -> np.ndarray:
+    """
+    Run the full extraction once on synthetic audio, so the first real request
+    doesn't pay for Numba compilation, FFT setup and lazy imports.
+
+    Uses low-level white noise rather than silence, which would send some
+    features down degenerate (all-zero) paths.
+
+    Returns:
+        numpy array of shape (1, 57), usable to warm up the model too
+    """
+    rng = np.random.default_rng(0)
+    y = (rng.standard_normal(int(SERVING_DURATION * SERVING_SR)) * 1e-2).astype(np.float32)
+    return _extract(y, SERVING_SR)
+
+
+def extract_features_from_file(file_path: str, duration: float = SERVING_DURATION) -> np.ndarray:
     """
     Extract features from an audio file on disk.
 
     Args:
         file_path: Path to the audio file (wav, mp3, ogg, flac, etc.)
-        duration: Duration in seconds to analyze (default: 30s to match training data)
+        duration: Duration in seconds to analyze (default: SERVING_DURATION, 30s to match training data)
 
     Returns:
         numpy array of shape (1, 57) — one row of features
     """
-    y, sr = librosa.load(file_path, duration=duration, sr=22050)
+    ext = file_path.rsplit('.', 1)[-1].lower()
+    if ext in SOUNDFILE_EXTENSIONS:
+        try:
+            y, sr = _load_soundfile(file_path, duration)
+            return _extract(y, sr)
+        except RuntimeError:
+            pass  # e.g. an unsupported ogg codec; let librosa try
+
+    y, sr = librosa.load(file_path, duration=duration, sr=SERVING_SR, res_type=RES_TYPE)
     return _extract(y, sr)
 
 
-def extract_features_from_bytes(audio_bytes: bytes, duration: float = 30.0) -> np.ndarray:
+def extract_features_from_bytes(audio_bytes: bytes, duration: float = SERVING_DURATION,
+                                suffix: str = '.webm') -> np.ndarray:
     """
-    Extract features from raw audio bytes (e.g. from browser MediaRecorder).
+    Extract features from raw audio bytes (e.g. an upload or browser MediaRecorder).
     Supports webm, ogg, wav, and any format soundfile/librosa can decode.
 
     Args:
         audio_bytes: Raw audio file bytes
         duration: Duration in seconds to analyze
+        suffix: File extension hint for the librosa fallback (e.g. '.mp3')
 
     Returns:
         numpy array of shape (1, 57)
     """
     # Try loading via soundfile first (handles wav, ogg, flac)
     try:
-        buf = io.BytesIO(audio_bytes)
-        y, sr = sf.read(buf, dtype='float32')
-        # Convert to mono if stereo
-        if y.ndim > 1:
-            y = np.mean(y, axis=1)
-        # Resample to 22050 if needed
-        if sr != 22050:
-            y = librosa.resample(y, orig_sr=sr, target_sr=22050)
-            sr = 22050
-        # Trim to duration
-        max_samples = int(duration * sr)
-        y = y[:max_samples]
+        y, sr = _load_soundfile(io.BytesIO(audio_bytes), duration)
     except Exception:
         # Fallback: write to temp file and let librosa handle it (for webm, mp3, etc.)
+        # Kept in RAM (/dev/shm) where available
         import tempfile
-        import os
-        with tempfile.NamedTemporaryFile(suffix='.webm', delete=False) as tmp:
+        with tempfile.NamedTemporaryFile(suffix=suffix, dir=TEMP_DIR, delete=False) as tmp:
             tmp.write(audio_bytes)
             tmp_path = tmp.name
         try:
-            y, sr = librosa.load(tmp_path, duration=duration, sr=22050)
+            y, sr = librosa.load(tmp_path, duration=duration, sr=SERVING_SR, res_type=RES_TYPE)
         finally:
             os.unlink(tmp_path)
 
     return _extract(y, sr)
 
 
+def _load_soundfile(source, duration: float, target_sr: int = SERVING_SR) -> tuple:
+    """
+    Decode audio with soundfile, the same way librosa.load would.
+
+    Only the first `duration` seconds are decoded. The signal is folded to
+    mono and resampled to target_sr with soxr.
+
+    Args:
+        source: File path or file-like object
+        duration: Duration in seconds to decode
+        target_sr: Output sample rate
+
+    Returns:
+        (y, sr) tuple
+    """
+    with sf.SoundFile(source) as f:
+        sr = f.samplerate
+        y = f.read(frames=int(duration * sr), dtype='float32', always_2d=False)
+
+    # Convert to mono if stereo
+    if y.ndim > 1:
+        y = np.mean(y, axis=1)
+    # Resample to target_sr if needed
+    if sr != target_sr:
+        y = librosa.resample(y, orig_sr=sr, target_sr=target_sr, res_type=RES_TYPE)
+        sr = target_sr
+    return y, sr
+
+
 def _extract(y: np.ndarray, sr: int) -> np.ndarray:
     """
     Core feature extraction from a waveform array.
@@ -97,59 +197,185 @@ def _extract(y: np.ndarray, sr: int) -> np.ndarray:
     # stationary=False adapts to varying noise (better for real-world recordings)
     y = nr.reduce_noise(y=y, sr=sr, stationary=False, prop_decrease=0.3)
 
-    features = []
-
-    # 1. Chroma STFT
-    chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-    features.append(chroma.mean())
-    features.append(chroma.var())
-
-    # 2. RMS Energy
-    rms = librosa.feature.rms(y=y)
-    features.append(rms.mean())
-    features.append(rms.var())
-
-    # 3. Spectral Centroid
-    spec_cent = librosa.feature.spectral_centroid(y=y, sr=sr)
-    features.append(spec_cent.mean())
-    features.append(spec_cent.var())
-
-    # 4. Spectral Bandwidth
-    spec_bw = librosa.feature.spectral_bandwidth(y=y, sr=sr)
-    features.append(spec_bw.mean())
-    features.append(spec_bw.var())
-
-    # 5. Spectral Rolloff
-    rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)
-    features.append(rolloff.mean())
-    features.append(rolloff.var())
-
-    # 6. Zero Crossing Rate
-    zcr = librosa.feature.zero_crossing_rate(y)
-    features.append(zcr.mean())
-    features.append(zcr.var())
-
-    # 7. Harmony & Percussive
-    harmony, perceptr = librosa.effects.hpss(y)
-    features.append(harmony.mean())
-    features.append(harmony.var())
-    features.append(perceptr.mean())
-    features.append(perceptr.var())
-
-    # 8. Tempo
-    tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
+    if FEATURE_BACKEND == 'torch':
+        return _extract_torch(y, sr)
+
+    # One STFT shared by every spectral feature below.
+    # Magnitude feeds the spectral shape features, power feeds chroma and the mel bank,
+    # exactly as librosa would compute them internally from y.
+    with scipy.fft.set_workers(FFT_WORKERS):
+        D = librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    S_mag = np.abs(D)
+    S_power = S_mag ** 2
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=N_FFT)
+    # Log-power mel spectrogram shared by the MFCCs and the onset envelope for tempo
+    mel_db = _mel_db(S_power, sr)
+
+    # The features below are independent once S is known, and spend their time
+    # in GIL-releasing code (FFT, BLAS, Numba), so they run concurrently.
+    # Slowest first so they start earliest; results land in FEATURE_NAMES order.
+    executor = _get_executor()
+    tasks = [
+        # 7. Harmony & Percussive
+        (slice(12, 16), executor.submit(_with_fft_workers, _hpss_stats, D, len(y))),
+        # 8. Tempo
+        (16, executor.submit(_with_fft_workers, _tempo, mel_db, sr)),
+        # 9. MFCCs 1-20
+        (slice(17, 57), executor.submit(_mfcc_stats, mel_db)),
+        # 1. Chroma STFT
+        (slice(0, 2), executor.submit(_mean_var, librosa.feature.chroma_stft, S=S_power, sr=sr)),
+        # 2. RMS Energy (time-domain frames, no FFT)
+        (slice(2, 4), executor.submit(
+            _mean_var, librosa.feature.rms, y=y, frame_length=N_FFT, hop_length=HOP_LENGTH)),
+        # 3. Spectral Centroid
+        (slice(4, 6), executor.submit(
+            _mean_var, librosa.feature.spectral_centroid, S=S_mag, freq=freqs)),
+        # 4. Spectral Bandwidth
+        (slice(6, 8), executor.submit(
+            _mean_var, librosa.feature.spectral_bandwidth, S=S_mag, freq=freqs)),
+        # 5. Spectral Rolloff
+        (slice(8, 10), executor.submit(
+            _mean_var, librosa.feature.spectral_rolloff, S=S_mag, freq=freqs)),
+        # 6. Zero Crossing Rate
+        (slice(10, 12), executor.submit(zcr_stats, y, N_FFT, HOP_LENGTH)),
+    ]
+
+    # Feature vector, filled by slice in FEATURE_NAMES order
+    out = np.empty(len(FEATURE_NAMES), dtype=np.float32)
+    for index, future in tasks:
+        out[index] = future.result()
+
+    return out.reshape(1, -1)
+
+
+def _extract_torch(y: np.ndarray, sr: int) -> np.ndarray:
+    """
+    Same features as _extract, with the spectral part computed by torch_features.
+    HPSS and tempo stay on librosa.
+    """
+    stats = torch_features.spectral_stats(y, sr)
+    out = np.empty(len(FEATURE_NAMES), dtype=np.float32)
+
+    out[:12] = stats[:12]
+    D = librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    out[12:16] = _hpss_stats(D, len(y))
+    out[16] = _tempo(_mel_db(np.abs(D) ** 2, sr), sr)
+    out[17:] = stats[12:]
+
+    return out.reshape(1, -1)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Thread pool for _extract, created on first use in each process.
+    A pool inherited across fork (e.g. gunicorn --preload) has no live threads.
+    """
+    global _executor, _executor_pid
+    if _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(
+                    max_workers=FEATURE_WORKERS, thread_name_prefix='features',
+                )
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _with_fft_workers(fn, *args, **kwargs):
+    """Run fn with scipy.fft using POOL_FFT_WORKERS threads (the setting is per thread)."""
+    with scipy.fft.set_workers(POOL_FFT_WORKERS):
+        return fn(*args, **kwargs)
+
+
+def _mean_var(feature_fn, *args, **kwargs) -> tuple:
+    """Run a librosa feature function and reduce its output to (mean, var)."""
+    values = feature_fn(*args, **kwargs)
+    return values.mean(), values.var()
+
+
+def _mel_db(S_power: np.ndarray, sr: int) -> np.ndarray:
+    """Log-power mel spectrogram, as librosa's mfcc and onset_strength compute it from y."""
+    mel = librosa.feature.melspectrogram(S=S_power, sr=sr, n_mels=128)
+    return librosa.power_to_db(mel)
+
+
+def _mfcc_stats(mel_db: np.ndarray) -> np.ndarray:
+    """MFCC 1-20 mean and var, interleaved per coefficient, from a log-power mel spectrogram."""
+    mfccs = librosa.feature.mfcc(S=mel_db, n_mfcc=20)
+    # One row-wise reduction for all 20 coefficients
+    return np.stack([mfccs.mean(axis=1), mfccs.var(axis=1)], axis=1).ravel()
+
+
+@numba.njit(cache=True, fastmath=True, nogil=True)
+def zcr_stats(y: np.ndarray, frame_length: int, hop_length: int) -> tuple:
+    """
+    Mean and var of the framewise zero crossing rate, in one pass.
+
+    Matches librosa.feature.zero_crossing_rate(y) (centered, edge padded
+    frames; samples with |y| <= 1e-10 count as zero, and zero counts as
+    positive) without materialising the framed signal.
+
+    Args:
+        y: Audio time series (mono)
+        frame_length: Samples per frame
+        hop_length: Samples between frame starts
+
+    Returns:
+        (mean, var) tuple
+    """
+    n = y.shape[0]
+    if n == 0:
+        return 0.0, 0.0
+    half = frame_length // 2
+    n_frames = 1 + (n + 2 * half - frame_length) // hop_length
+
+    total = 0.0
+    total_sq = 0.0
+    for f in range(n_frames):
+        # Frame start in unpadded coordinates; clamping the index is the edge padding
+        start = f * hop_length - half
+        prev = y[min(max(start, 0), n - 1)] >= -1e-10
+        crossings = 0
+        for j in range(1, frame_length):
+            cur = y[min(max(start + j, 0), n - 1)] >= -1e-10
+            if cur != prev:
+                crossings += 1
+            prev = cur
+        rate = crossings / frame_length
+        total += rate
+        total_sq += rate * rate
+
+    mean = total / n_frames
+    return mean, max(total_sq / n_frames - mean * mean, 0.0)
+
+
+def _hpss_stats(D: np.ndarray, length: int) -> tuple:
+    """
+    Harmonic/percussive mean and var from a complex STFT.
+
+    Separating D directly is what librosa.effects.hpss does after its own STFT.
+    With HPSS_SPECTRAL the stats are taken on the separated magnitudes
+    and the two inverse STFTs are skipped.
+    """
+    harmony, perceptr = librosa.decompose.hpss(D)
+    if HPSS_SPECTRAL:
+        harmony, perceptr = np.abs(harmony), np.abs(perceptr)
+    else:
+        harmony = librosa.istft(harmony, hop_length=HOP_LENGTH, length=length)
+        perceptr = librosa.istft(perceptr, hop_length=HOP_LENGTH, length=length)
+    return harmony.mean(), harmony.var(), perceptr.mean(), perceptr.var()
+
+
+def _tempo(mel_db: np.ndarray, sr: int) -> float:
+    """Global tempo estimate in BPM from a log-power mel spectrogram."""
+    # Same onset envelope beat_track(y=y) computes (it aggregates with the median),
+    # without another STFT
+    onset_env = librosa.onset.onset_strength(S=mel_db, sr=sr, aggregate=np.median)
+    tempo, _ = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr, hop_length=HOP_LENGTH)
     # librosa >= 0.10 returns an array; extract scalar
     if isinstance(tempo, np.ndarray):
         tempo = tempo.item()
-    features.append(float(tempo))
-
-    # 9. MFCCs 1-20
-    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=20)
-    for i in range(20):
-        features.append(mfccs[i].mean())
-        features.append(mfccs[i].var())
-
-    return pd.DataFrame([features], columns=FEATURE_NAMES)
+    return float(tempo)
 
 
 def get_system_audio_monitor() -> str:
@@ -187,7 +413,9 @@ def extract_features_from_system_audio(duration: float = 10.0) -> np.ndarray:
     Capture system audio (whatever is currently playing through speakers)
     and extract features from it.
 
-    Uses PulseAudio/PipeWire's `parec` to record from the monitor source.
+    Records from the PulseAudio/PipeWire monitor source in-process via
+    pasimple, falling back to `parec` when the binding isn't available or
+    the stream can't be opened.
 
     Args:
         duration: Seconds of audio to capture (default: 10s)
@@ -198,10 +426,48 @@ def extract_features_from_system_audio(duration: float = 10.0) -> np.ndarray:
     Raises:
         RuntimeError: If no audio system is available or no audio is playing
     """
+    monitor = get_system_audio_monitor()
+    sample_rate = SERVING_SR
+
+    try:
+        y = _capture_pasimple(monitor, duration, sample_rate)
+    except (ImportError, OSError):
+        # No libpulse binding, or the stream failed: record through parec instead
+        y = _capture_parec(monitor, duration, sample_rate)
+
+    return _extract(y, sample_rate)
+
+
+def _capture_pasimple(monitor: str, duration: float, sample_rate: int) -> np.ndarray:
+    """
+    Record mono float32 audio from a monitor source in-process with pasimple
+    (libpulse-simple; PipeWire serves the same API).
+
+    The source is named per stream, so nothing process-wide changes and a new
+    output device is picked up as soon as get_system_audio_monitor reports it.
+    """
+    import pasimple
+
+    num_bytes = int(duration * sample_rate) * 4  # 4 bytes per float32 sample
+    try:
+        with pasimple.PaSimple(
+            pasimple.PA_STREAM_RECORD, pasimple.PA_SAMPLE_FLOAT32LE, 1, sample_rate,
+            app_name='genre-classifier', device_name=monitor,
+        ) as stream:
+            raw_audio = stream.read(num_bytes)
+    except pasimple.PaSimpleError as e:
+        raise OSError(f"PulseAudio capture failed: {e}")
+
+    # Already float32 in [-1.0, 1.0]
+    return np.frombuffer(raw_audio, dtype=np.float32)
+
+
+def _capture_parec(monitor: str, duration: float, sample_rate: int) -> np.ndarray:
+    """
+    Record mono audio from a monitor source with PulseAudio/PipeWire's `parec`.
+    """
     import subprocess
 
-    monitor = get_system_audio_monitor()
-    sample_rate = 22050
     channels = 1
 
     # Record raw PCM audio from the system monitor source
@@ -227,6 +493,4 @@ def extract_features_from_system_audio(duration: float = 10.0) -> np.ndarray:
 
     # Convert raw PCM bytes to numpy float array
     y = np.frombuffer(raw_audio, dtype=np.int16).astype(np.float32)
-    y = y / 32768.0  # normalize to [-1.0, 1.0]
-
-    return _extract(y, sample_rate)
+    return y / 32768.0  # normalize to [-1.0, 1.0]
@@ -0,0 +1,28 @@
+"""
+gunicorn settings for serving the classifier:
+
+    gunicorn app:app
+
+With preload_app the master loads the model artifacts (and runs the warm-up)
+once, then forks; workers share that memory copy-on-write instead of each
+loading their own copy. Per-process thread pools and the micro-batcher start
+lazily in each worker, so they are fork-safe.
+
+The micro-batcher coalesces requests within one worker process only, so with
+`threads = 2` a worker's batches never hold more than 2 rows.
+"""
+import multiprocessing
+import os
+
+
+bind = os.environ.get('GENRE_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GENRE_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = 2   # requests in one worker share its micro-batcher
+
+# CUDA can't be initialised before fork, so the torch backend loads per worker
+preload_app = os.environ.get('GENRE_FEATURE_BACKEND', 'librosa') != 'torch'
+
+# Worker processes already use every core, so keep the per-request feature pool
+# small (read by feature_extractor when the app is loaded)
+os.environ.setdefault('GENRE_FEATURE_WORKERS', '2')
@@ -0,0 +1,64 @@
+import threading
+
+import numpy as np
+import pytest
+
+from batcher import MicroBatcher
+
+
+def _submit_concurrently(batcher, rows):
+    results = [None] * len(rows)
+
+    def worker(i):
+        try:
+            results[i] = batcher.submit(rows[i])
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(rows))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+    return results
+
+
+def test_rows_are_routed_back_to_their_callers():
+    calls = []
+
+    def batch_fn(X):
+        calls.append(len(X))
+        return X * 2
+
+    batcher = MicroBatcher(batch_fn, max_wait=0.2)
+    rows = [np.full((1, 3), i, dtype=np.float32) for i in range(8)]
+    results = _submit_concurrently(batcher, rows)
+
+    for row, result in zip(rows, results):
+        np.testing.assert_array_equal(result, row[0] * 2)
+    assert sum(calls) == len(rows)
+    assert max(calls) > 1  # requests were actually coalesced
+
+
+def test_error_only_reaches_the_failing_row():
+    def batch_fn(X):
+        if np.isnan(X).any():
+            raise ValueError("Input X contains NaN.")
+        return X + 1
+
+    batcher = MicroBatcher(batch_fn, max_wait=0.2)
+    good = np.zeros((1, 3))
+    bad = np.full((1, 3), np.nan)
+    results = _submit_concurrently(batcher, [good, bad, good])
+
+    np.testing.assert_array_equal(results[0], np.ones(3))
+    assert isinstance(results[1], ValueError)
+    np.testing.assert_array_equal(results[2], np.ones(3))
+
+
+def test_single_row_error_is_raised():
+    def batch_fn(X):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        MicroBatcher(batch_fn).submit(np.zeros((1, 3)))
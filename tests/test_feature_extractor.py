@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+librosa = pytest.importorskip('librosa')
+pytest.importorskip('numba')
+pytest.importorskip('noisereduce')
+pytest.importorskip('soundfile')
+
+from feature_extractor import HOP_LENGTH, N_FFT, zcr_stats
+
+
+SR = 22050
+
+
+def _librosa_zcr(y):
+    zcr = librosa.feature.zero_crossing_rate(y, frame_length=N_FFT, hop_length=HOP_LENGTH)
+    return zcr.mean(), zcr.var()
+
+
+@pytest.mark.parametrize('n_samples', [1, 100, N_FFT - 1, N_FFT, N_FFT + 1, 30 * SR])
+def test_zcr_stats_matches_librosa(n_samples):
+    rng = np.random.default_rng(n_samples)
+    t = np.arange(n_samples) / SR
+    y = (np.sin(2 * np.pi * 220 * t) + 0.5 * rng.standard_normal(n_samples)).astype(np.float32)
+
+    np.testing.assert_allclose(zcr_stats(y, N_FFT, HOP_LENGTH), _librosa_zcr(y), rtol=1e-6, atol=1e-9)
+
+
+def test_zcr_stats_counts_tiny_values_as_zero():
+    # |y| <= 1e-10 is zero, and zero is positive, as in librosa
+    y = np.tile(np.array([1.0, -1e-12, 1.0, -1.0], dtype=np.float32), 2000)
+    np.testing.assert_allclose(zcr_stats(y, N_FFT, HOP_LENGTH), _librosa_zcr(y), rtol=1e-6, atol=1e-9)
+
+
+def test_zcr_stats_empty_signal():
+    assert zcr_stats(np.zeros(0, dtype=np.float32), N_FFT, HOP_LENGTH) == (0.0, 0.0)
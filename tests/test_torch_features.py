@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+librosa = pytest.importorskip('librosa')
+pytest.importorskip('torch')
+pytest.importorskip('torchaudio')
+
+import torch_features
+
+
+SR = 22050
+
+
+@pytest.fixture(scope='module')
+def signal():
+    rng = np.random.default_rng(0)
+    t = np.arange(5 * SR) / SR
+    y = 0.5 * np.sin(2 * np.pi * 440 * t) + 0.3 * np.sin(2 * np.pi * 1250 * t * (1 + t / 10))
+    return (y + 0.05 * rng.standard_normal(t.size)).astype(np.float32)
+
+
+def _mean_var(x):
+    return [x.mean(), x.var()]
+
+
+def test_module_scripts():
+    module = torch_features.get_module(SR)
+    assert hasattr(module, 'graph')
+
+
+def test_matches_librosa(signal):
+    stats = torch_features.spectral_stats(signal, SR)
+    assert stats.shape == (52,)
+
+    S_mag = np.abs(librosa.stft(signal, n_fft=2048, hop_length=512))
+    freqs = librosa.fft_frequencies(sr=SR, n_fft=2048)
+    mel = librosa.feature.melspectrogram(S=S_mag ** 2, sr=SR, n_mels=128)
+    mfccs = librosa.feature.mfcc(S=librosa.power_to_db(mel), n_mfcc=20)
+
+    expected = (
+        _mean_var(librosa.feature.chroma_stft(S=S_mag ** 2, sr=SR, tuning=0.0))
+        + _mean_var(librosa.feature.rms(y=signal))
+        + _mean_var(librosa.feature.spectral_centroid(S=S_mag, freq=freqs))
+        + _mean_var(librosa.feature.spectral_bandwidth(S=S_mag, freq=freqs))
+        + _mean_var(librosa.feature.spectral_rolloff(S=S_mag, freq=freqs))
+        + _mean_var(librosa.feature.zero_crossing_rate(signal))
+        + np.stack([mfccs.mean(axis=1), mfccs.var(axis=1)], axis=1).ravel().tolist()
+    )
+
+    np.testing.assert_allclose(stats, np.asarray(expected), rtol=1e-3, atol=1e-3)
@@ -0,0 +1,130 @@
+"""
+TorchAudio implementation of the spectral part of the feature pipeline.
+
+Everything that can be derived from a single STFT (chroma, spectral shape,
+MFCCs) plus the frame-based RMS and zero crossing rate runs inside one
+TorchScript module, on the GPU when one is available. HPSS and beat tracking
+stay on librosa (CPU).
+
+Enabled with GENRE_FEATURE_BACKEND=torch (see feature_extractor.py).
+"""
+import functools
+
+import librosa
+import numpy as np
+import torch
+import torch.nn.functional as F
+import torchaudio
+
+
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+N_MFCC = 20
+
+DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+
+def _mean_var(x: torch.Tensor) -> torch.Tensor:
+    # Population variance, same as numpy's .var()
+    return torch.stack([x.mean(), x.var(unbiased=False)])
+
+
+class SpectralFeatures(torch.nn.Module):
+    """
+    Computes the 52 STFT/frame-based statistics, in FEATURE_NAMES order:
+    chroma, rms, centroid, bandwidth, rolloff, zcr (mean/var each),
+    then mfcc1..20 (mean, var interleaved).
+
+    Filter banks follow librosa's defaults so values line up with the
+    training data. Chroma uses tuning=0 instead of librosa's per-clip
+    tuning estimate.
+    """
+
+    # TorchScript can't read module-level globals inside forward()
+    n_fft: torch.jit.Final[int]
+    hop_length: torch.jit.Final[int]
+
+    def __init__(self, sr: int):
+        super().__init__()
+        self.n_fft = N_FFT
+        self.hop_length = HOP_LENGTH
+        n_freqs = N_FFT // 2 + 1
+        # One magnitude spectrogram shared by every spectral feature
+        self.spectrogram = torchaudio.transforms.Spectrogram(
+            n_fft=N_FFT, hop_length=HOP_LENGTH, pad_mode='constant', power=1.0,
+        )
+        self.mel_scale = torchaudio.transforms.MelScale(
+            n_mels=N_MELS, sample_rate=sr, n_stft=n_freqs, norm='slaney', mel_scale='slaney',
+        )
+        self.register_buffer('freqs', torch.linspace(0, sr / 2, n_freqs).unsqueeze(-1))
+        self.register_buffer(
+            'chroma_fb', torch.from_numpy(librosa.filters.chroma(sr=sr, n_fft=N_FFT)).float()
+        )
+        self.register_buffer('dct', torchaudio.functional.create_dct(N_MFCC, N_MELS, 'ortho'))
+
+    def forward(self, y: torch.Tensor) -> torch.Tensor:
+        mag = self.spectrogram(y)           # (freq, frames)
+        power = mag.pow(2)
+
+        # 1. Chroma STFT (max-normalized per frame)
+        chroma = torch.matmul(self.chroma_fb, power)
+        chroma = chroma / chroma.amax(dim=0, keepdim=True).clamp(min=1e-10)
+
+        # 2. RMS Energy (time-domain frames, zero padded)
+        half = self.n_fft // 2
+        frames = F.pad(y, [half, half]).unfold(0, self.n_fft, self.hop_length)
+        rms = frames.pow(2).mean(dim=-1).sqrt()
+
+        # 3-5. Spectral centroid / bandwidth / rolloff as weighted-frequency reductions
+        weights = mag / mag.sum(dim=0, keepdim=True).clamp(min=1e-10)
+        centroid = (self.freqs * weights).sum(dim=0)
+        bandwidth = (weights * (self.freqs - centroid).pow(2)).sum(dim=0).sqrt()
+        energy = torch.cumsum(mag, dim=0)
+        below = energy < 0.85 * energy[-1]
+        rolloff = torch.where(
+            below, torch.full_like(energy, float('inf')), self.freqs.expand_as(energy)
+        ).amin(dim=0)
+
+        # 6. Zero Crossing Rate (edge padded frames)
+        padded = F.pad(y.view(1, 1, -1), [half, half], mode='replicate').view(-1)
+        positive = padded.unfold(0, self.n_fft, self.hop_length) >= -1e-10
+        zcr = (positive[:, 1:] != positive[:, :-1]).float().sum(dim=-1) / self.n_fft
+
+        # 9. MFCCs 1-20 from the same spectrogram
+        mel_db = 10.0 * torch.log10(self.mel_scale(power).clamp(min=1e-10))
+        mel_db = torch.maximum(mel_db, mel_db.max() - 80.0)
+        mfccs = torch.matmul(mel_db.transpose(0, 1), self.dct).transpose(0, 1)
+        mfcc_stats = torch.stack(
+            [mfccs.mean(dim=-1), mfccs.var(dim=-1, unbiased=False)], dim=-1
+        ).reshape(-1)
+
+        return torch.cat([
+            _mean_var(chroma), _mean_var(rms),
+            _mean_var(centroid), _mean_var(bandwidth), _mean_var(rolloff),
+            _mean_var(zcr), mfcc_stats,
+        ])
+
+
+@functools.lru_cache(maxsize=None)
+def get_module(sr: int) -> torch.jit.ScriptModule:
+    """Scripted SpectralFeatures for a sample rate, built once and kept on DEVICE."""
+    return torch.jit.script(SpectralFeatures(sr).to(DEVICE).eval())
+
+
+def spectral_stats(y: np.ndarray, sr: int) -> np.ndarray:
+    """
+    Run SpectralFeatures on a waveform.
+
+    Args:
+        y: Audio time series (mono)
+        sr: Sample rate
+
+    Returns:
+        numpy array of 52 statistics (see SpectralFeatures)
+    """
+    signal = torch.from_numpy(np.ascontiguousarray(y, dtype=np.float32)).to(DEVICE)
+    with torch.inference_mode():
+        stats = get_module(sr)(signal)
+    return stats.cpu().numpy()
+